@@ -84,6 +84,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Generated responses and chat history are shared across workers through Redis
+# when REDIS_URL is set; otherwise Django's per-process local-memory cache is used.
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                # Treat Redis outages as cache misses instead of failing requests
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -127,3 +148,31 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Google Gemini API Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Most Gemini requests each event loop (one per ASGI worker) keeps waiting on a response at once
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '32'))
+
+# Reuse replies to near-duplicate chat messages (cosine similarity of their
+# embeddings). Set SEMANTIC_CACHE_ENABLED=False where wording differences matter.
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True') == 'True'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# App logs go through a queue so the write to stderr happens off the request thread
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queue': {
+            '()': 'medical_app.log_handlers.QueueListenerHandler',
+        },
+    },
+    'loggers': {
+        'medical_app': {
+            'handlers': ['queue'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,25 @@
+"""Logging handlers used by the project's LOGGING configuration"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """Queue records and write them to stderr from a background thread.
+
+    The request thread only enqueues the record; the QueueListener does the
+    actual stream I/O, so logging never blocks a view on stdout/stderr.
+    """
+
+    def __init__(self):
+        super().__init__(queue.SimpleQueue())
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(
+            logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        )
+        self.listener = logging.handlers.QueueListener(
+            self.queue, stream_handler, respect_handler_level=True
+        )
+        self.listener.start()
+        atexit.register(self.listener.stop)
@@ -0,0 +1,43 @@
+"""Request bodies accepted by the chat API, decoded with msgspec"""
+from typing import Annotated
+
+import msgspec
+
+# Most client-side history messages (3 exchanges) a chat request may carry
+MAX_HISTORY_MESSAGES = 6
+
+
+class IntakeData(msgspec.Struct, rename='camel'):
+    """Answers from the landing-page intake form"""
+    age_range: str = 'Not specified'
+    sex: str = 'Not specified'
+    symptom: str = 'Not specified'
+    duration: str = 'Not specified'
+    severity: str = 'Not specified'
+    context: str = 'None provided'
+
+    def is_empty(self):
+        """True when the form sent none of the intake fields"""
+        return self == _EMPTY_INTAKE
+
+
+_EMPTY_INTAKE = IntakeData()
+
+
+class HistoryMessage(msgspec.Struct):
+    """One message of the conversation as kept by the browser"""
+    role: str = ''
+    content: str = ''
+
+
+class ChatRequest(msgspec.Struct):
+    """Body of a POST to the chat endpoint"""
+    message: str = ''
+    conversation_id: str = ''
+    history: Annotated[list[HistoryMessage], msgspec.Meta(max_length=MAX_HISTORY_MESSAGES)] = []
+    intake_data: IntakeData = msgspec.field(default_factory=IntakeData)
+
+
+class ConsultationRequest(msgspec.Struct):
+    """Body of a POST to the initial consultation endpoint"""
+    intake_data: IntakeData = msgspec.field(default_factory=IntakeData)
@@ -0,0 +1,57 @@
+"""In-process cache that matches chat messages by embedding similarity"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize(vector):
+    """Return vector as a unit-length float32 array, so a dot product is cosine similarity"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """LRU cache of replies looked up by the nearest message embedding.
+
+    Entries are grouped by namespace: the exact context a reply depends on
+    (intake details, previous answer). Only messages in the same namespace
+    are compared, with a brute-force inner product over their unit vectors.
+    """
+
+    def __init__(self, maxsize=1024, threshold=0.92):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        # namespace -> {message: (vector, reply)}
+        self._namespaces = {}
+        # (namespace, message) keys in least- to most-recently-used order
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, vector):
+        """Return the reply for the most similar message above threshold, or None"""
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if not entries:
+                return None
+            messages = list(entries)
+            scores = np.stack([entries[message][0] for message in messages]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._lru.move_to_end((namespace, messages[best]))
+            return entries[messages[best]][1]
+
+    def set(self, namespace, message, vector, reply):
+        """Store reply for message, evicting the least recently used entries"""
+        with self._lock:
+            self._namespaces.setdefault(namespace, {})[message] = (vector, reply)
+            self._lru[(namespace, message)] = None
+            self._lru.move_to_end((namespace, message))
+            while len(self._lru) > self.maxsize:
+                old_namespace, old_message = self._lru.popitem(last=False)[0]
+                entries = self._namespaces[old_namespace]
+                del entries[old_message]
+                if not entries:
+                    del self._namespaces[old_namespace]
@@ -1,3 +1,277 @@
-from django.test import TestCase
+import contextlib
+import json
+import types as namespaces
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import msgspec
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from google.genai import types
+
+from . import views
+from .schemas import ChatRequest, IntakeData
+from .semantic_cache import SemanticCache, normalize
+
+INTAKE = {'ageRange': '30-39', 'sex': 'female', 'symptom': 'Headache', 'severity': '2'}
+
+
+def _response(text, finish_reason=types.FinishReason.STOP):
+    """Build a Gemini response chunk carrying text"""
+    return types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role='model', parts=[types.Part.from_text(text=text)]),
+        finish_reason=finish_reason,
+    )])
+
+
+class FakeModels:
+    """Stands in for client.aio.models, recording what each view sends"""
+
+    def __init__(self):
+        self.reply = ['<p>Rest and ', 'drink water.</p>']
+        self.finish_reason = types.FinishReason.STOP
+        self.triage = 'ROUTINE'
+        self.embeddings = {}
+        self.stream_calls = []
+
+    async def generate_content_stream(self, *, model, contents, config):
+        self.stream_calls.append(contents)
+        last = len(self.reply) - 1
+
+        async def chunks():
+            for i, text in enumerate(self.reply):
+                yield _response(text, self.finish_reason if i == last else None)
+
+        return chunks()
+
+    async def generate_content(self, *, model, contents, config):
+        if isinstance(self.triage, Exception):
+            raise self.triage
+        return _response(self.triage)
+
+    async def embed_content(self, *, model, contents, config):
+        if isinstance(self.embeddings, Exception):
+            raise self.embeddings
+        values = self.embeddings.get(contents, [0.0, 0.0, 1.0])
+        return types.EmbedContentResponse(embeddings=[types.ContentEmbedding(values=values)])
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def test_similar_message_returns_reply(self):
+        semantic_cache = SemanticCache(maxsize=4, threshold=0.9)
+        semantic_cache.set('ns', 'my head hurts', normalize([1.0, 0.1]), 'reply')
+        self.assertEqual(semantic_cache.get('ns', normalize([1.0, 0.15])), 'reply')
+
+    def test_dissimilar_message_misses(self):
+        semantic_cache = SemanticCache(maxsize=4, threshold=0.9)
+        semantic_cache.set('ns', 'my head hurts', normalize([1.0, 0.0]), 'reply')
+        self.assertIsNone(semantic_cache.get('ns', normalize([1.0, 1.0])))
+
+    def test_namespaces_are_separate(self):
+        semantic_cache = SemanticCache(maxsize=4, threshold=0.9)
+        semantic_cache.set('ns', 'my head hurts', normalize([1.0, 0.0]), 'reply')
+        self.assertIsNone(semantic_cache.get('other', normalize([1.0, 0.0])))
+
+    def test_evicts_least_recently_used(self):
+        semantic_cache = SemanticCache(maxsize=2, threshold=0.9)
+        semantic_cache.set('ns', 'a', normalize([1.0, 0.0, 0.0]), 'reply a')
+        semantic_cache.set('ns', 'b', normalize([0.0, 1.0, 0.0]), 'reply b')
+        semantic_cache.get('ns', normalize([1.0, 0.0, 0.0]))
+        semantic_cache.set('ns', 'c', normalize([0.0, 0.0, 1.0]), 'reply c')
+        self.assertEqual(semantic_cache.get('ns', normalize([1.0, 0.0, 0.0])), 'reply a')
+        self.assertIsNone(semantic_cache.get('ns', normalize([0.0, 1.0, 0.0])))
+        self.assertEqual(semantic_cache.get('ns', normalize([0.0, 0.0, 1.0])), 'reply c')
+
+    def test_normalize_returns_unit_vector(self):
+        self.assertAlmostEqual(float(np.linalg.norm(normalize([3.0, 4.0]))), 1.0, places=6)
+
+
+class SchemaTests(SimpleTestCase):
+    def test_intake_is_empty_without_fields(self):
+        self.assertTrue(IntakeData().is_empty())
+        self.assertFalse(IntakeData(symptom='cough').is_empty())
+
+    def test_chat_request_decodes_camel_case_intake(self):
+        request = msgspec.json.decode(
+            json.dumps({'message': 'hi', 'intake_data': {'ageRange': '30-39'}}), type=ChatRequest
+        )
+        self.assertEqual(request.intake_data.age_range, '30-39')
+        self.assertEqual(request.history, [])
+
+
+class APITestCase(TestCase):
+    """Runs the API views against FakeModels instead of Gemini"""
+
+    def setUp(self):
+        cache.clear()
+        views._response_cache.clear()
+        self.models = FakeModels()
+        client = namespaces.SimpleNamespace(aio=namespaces.SimpleNamespace(models=self.models))
+        for patcher in (
+            mock.patch.object(views, '_gemini_client', lambda: client),
+            mock.patch.object(views, '_gemini_semaphore', contextlib.nullcontext),
+            mock.patch.object(views, '_semantic_cache', SemanticCache(maxsize=16, threshold=0.92)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def post(self, url, payload):
+        """POST payload as JSON and return the response with its decoded events"""
+        body = payload if isinstance(payload, bytes) else json.dumps(payload)
+        response = await self.async_client.post(url, body, content_type='application/json')
+        if not response.streaming:
+            return response, None
+        stream = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = [json.loads(event[6:]) for event in stream.split('\n\n') if event.startswith('data: ')]
+        return response, events
+
+    async def consult(self, intake=INTAKE):
+        return await self.post('/api/initial-consultation/', {'intake_data': intake})
+
+    async def chat(self, message, **fields):
+        return await self.post('/api/chat/', {'message': message, **fields})
+
+
+class RequestValidationTests(APITestCase):
+    async def test_malformed_body_is_rejected(self):
+        for url in ('/api/chat/', '/api/initial-consultation/'):
+            response, _ = await self.post(url, b'{not json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Invalid request', json.loads(response.content)['error'])
+
+    async def test_missing_message_is_rejected(self):
+        response, _ = await self.chat('')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_empty_intake_is_rejected(self):
+        response, _ = await self.consult({})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_oversized_history_is_rejected(self):
+        history = [{'role': 'user', 'content': 'hi'}] * 7
+        response, _ = await self.chat('hello', history=history)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.models.stream_calls, [])
+
+    async def test_get_is_not_allowed(self):
+        response = await self.async_client.get('/api/chat/')
+        self.assertEqual(response.status_code, 405)
+
+
+class ConsultationTests(APITestCase):
+    async def test_repeat_intake_is_served_from_cache(self):
+        response, events = await self.consult()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(events[-1], {'status': 'success'})
+        # Free-text fields are normalized for the cache key
+        response, events = await self.consult({**INTAKE, 'symptom': ' headache '})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(events[1], {'text': '<p>Rest and drink water.</p>'})
+        self.assertEqual(len(self.models.stream_calls), 1)
+
+    async def test_urgent_triage_prepends_notice(self):
+        self.models.triage = 'URGENT'
+        _, events = await self.consult()
+        self.assertEqual(events[1], {'text': views.URGENT_CARE_NOTICE})
+
+    async def test_failed_triage_is_not_cached(self):
+        self.models.triage = RuntimeError('triage down')
+        with self.assertLogs('medical_app.views', 'WARNING'):
+            response, _ = await self.consult()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.models.triage = 'URGENT'
+        response, events = await self.consult()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(events[1], {'text': views.URGENT_CARE_NOTICE})
+
+    async def test_incomplete_reply_is_not_cached(self):
+        for finish_reason in (types.FinishReason.MAX_TOKENS, types.FinishReason.SAFETY, None):
+            with self.subTest(finish_reason=finish_reason):
+                self.models.finish_reason = finish_reason
+                with self.assertLogs('medical_app.views', 'WARNING'):
+                    await self.consult()
+                    response, _ = await self.consult()
+                self.assertEqual(response['X-Cache'], 'MISS')
+                cache.clear()
+                views._response_cache.clear()
+
+
+class ChatTests(APITestCase):
+    async def test_conversation_id_round_trips(self):
+        _, first = await self.consult()
+        _, second = await self.consult({**INTAKE, 'symptom': 'knee pain'})
+        conversation_id = first[0]['conversation_id']
+        self.assertNotEqual(conversation_id, second[0]['conversation_id'])
+
+        _, events = await self.chat('Is it serious?', conversation_id=conversation_id)
+        self.assertEqual(events[0], {'conversation_id': conversation_id})
+        # Stored opening exchange plus the new message, and none of the other tab's intake
+        contents = self.models.stream_calls[-1]
+        self.assertEqual([content.role for content in contents], ['user', 'model', 'user'])
+        self.assertIn('Headache', contents[0].parts[0].text)
+        self.assertNotIn('knee pain', contents[0].parts[0].text)
+        self.assertEqual(contents[2].parts[0].text, 'Is it serious?')
+
+    async def test_unknown_conversation_id_starts_a_new_conversation(self):
+        _, events = await self.chat('hello', conversation_id='not-an-id')
+        self.assertRegex(events[0]['conversation_id'], r'^[0-9a-f]{32}$')
+
+    async def test_repeat_follow_up_hits_cache(self):
+        _, consultation = await self.consult()
+        conversation_id = consultation[0]['conversation_id']
+        response, _ = await self.chat('Is it serious?', conversation_id=conversation_id, intake_data=INTAKE)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        # A new tab replaying the same reply from the client's copy shares the key
+        reply = ''.join(event.get('text', '') for event in consultation)
+        history = [{'role': 'assistant', 'content': reply}]
+        response, _ = await self.chat('Is it serious?', history=history, intake_data=INTAKE)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        # A different previous reply is a different context
+        history = [{'role': 'assistant', 'content': reply + '<p>More.</p>'}]
+        response, _ = await self.chat('Is it serious?', history=history, intake_data=INTAKE)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    @override_settings(SEMANTIC_CACHE_ENABLED=True)
+    async def test_similar_follow_up_is_a_semantic_hit(self):
+        self.models.embeddings = {
+            'I have a headache': [1.0, 0.0, 0.0],
+            'My head hurts': [0.99, 0.05, 0.0],
+        }
+        response, _ = await self.chat('I have a headache')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response, events = await self.chat('My head hurts')
+        self.assertEqual(response['X-Cache'], 'SEMANTIC-HIT')
+        self.assertEqual(events[1], {'text': '<p>Rest and drink water.</p>'})
+        self.assertEqual(len(self.models.stream_calls), 1)
+
+    @override_settings(SEMANTIC_CACHE_ENABLED=True)
+    async def test_embedding_failure_falls_through_to_gemini(self):
+        self.models.embeddings = httpx.ConnectTimeout('timed out')
+        with self.assertLogs('medical_app.views', 'WARNING'):
+            response, events = await self.chat('hello')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(events[-1], {'status': 'success'})
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_opening_exchange_is_pinned_and_recent_turns_trimmed(self):
+        history = []
+        for turn in range(6):
+            await views._save_exchange('c' * 32, history, f'message {turn}', f'<p>reply {turn}</p>')
+            history = await views._load_history('c' * 32)
+        self.assertEqual(
+            [entry['parts'][0] for entry in history],
+            ['message 0', 'reply 0', 'message 3', 'reply 3', 'message 4', 'reply 4', 'message 5', 'reply 5'],
+        )
+        self.assertEqual(history[-1]['reply_digest'], views._reply_digest('<p>reply 5</p>'))
+
+    def test_history_replies_are_stripped_and_truncated(self):
+        clean = views._clean_for_history('<p>' + 'a' * 600 + '</p>')
+        self.assertEqual(clean, 'a' * views.MAX_HIST_CHARS + '…')
@@ -1,166 +1,63 @@
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.csrf import ensure_csrf_cookie
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from django.conf import settings
-import json
-import google.generativeai as genai
-
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-# Create your views here.
-
-@ensure_csrf_cookie
-def landing_view(request):
-    """Landing page with intake form"""
-    return render(request, 'landing.html')
-
-@ensure_csrf_cookie
-def chat_view(request):
-    """Chat interface page"""
-    return render(request, 'chat.html')
-
-def chat_api(request):
-    """API endpoint for chat messages"""
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            user_message = data.get('message', '')
-            conversation_history = data.get('history', [])
-            intake_data = data.get('intake_data', {})
-
-            if not user_message:
-                return JsonResponse({'error': 'No message provided'}, status=400)
-
-            # Create the model (using Gemini 1.5 Flash - better free tier limits)
-            model = genai.GenerativeModel('gemini-2.5-flash')
-
-            # Build the system prompt with medical guidelines
-            system_context = """You are MedAI, a compassionate and knowledgeable medical AI assistant. Your role is to provide evidence-based health information and guidance while maintaining appropriate medical boundaries.
-
-IMPORTANT GUIDELINES:
-1. Be empathetic, supportive, and use clear language
-2. Provide general health information and education
-3. Always emphasize that you're not a substitute for professional medical advice
-4. Never provide specific medical diagnoses or prescriptions
-5. Focus on self-care guidance and when to seek medical attention
-6. If symptoms sound serious or life-threatening, strongly urge immediate medical attention
-7. Structure responses clearly with sections like "Possible Causes", "Self-Care Advice", "When to See a Doctor"
-8. Use HTML formatting for better readability (paragraphs, lists, bold text)
-
-EMERGENCY SYMPTOMS that require immediate medical attention:
+from django.core.cache import cache
+import asyncio
+import collections
+import hashlib
+import logging
+import re
+import threading
+import uuid
+import cachetools
+import httpx
+import msgspec
+import orjson
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
+from .schemas import ChatRequest, ConsultationRequest
+from .semantic_cache import SemanticCache, normalize as normalize_embedding
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL_NAME = 'models/gemini-2.5-flash'
+EMBEDDING_MODEL_NAME = 'models/text-embedding-004'
+TRIAGE_MODEL_NAME = 'models/gemini-2.5-flash-lite'
+
+# Static MedAI instructions shared by every request. They are sent as the
+# system instruction, ahead of the patient-specific part, so the identical
+# prefix is eligible for Gemini's implicit context caching.
+MEDAI_SYSTEM_PROMPT = """You are MedAI, a compassionate, knowledgeable medical AI assistant. Give evidence-based health information and guidance within appropriate medical boundaries.
+
+GUIDELINES:
+- Be empathetic and supportive; use clear language
+- Give general health information and education
+- Remind patients you are not a substitute for professional medical advice
+- Never give specific diagnoses or prescriptions
+- Focus on self-care and when to seek medical attention
+- Strongly urge immediate medical attention for serious or life-threatening symptoms
+- Use sections like "Possible Causes", "Self-Care Advice", "When to See a Doctor"
+- Format with HTML (paragraphs, lists, bold text)
+
+EMERGENCY SYMPTOMS (urge immediate medical attention):
 - Difficulty breathing or shortness of breath
 - Chest pain or pressure
 - Severe bleeding
 - Loss of consciousness or severe confusion
 - Severe allergic reactions
-- Suspected stroke symptoms (FAST: Face drooping, Arm weakness, Speech difficulty, Time to call 911)
+- Suspected stroke (FAST: Face drooping, Arm weakness, Speech difficulty, Time to call 911)
 - Severe abdominal pain
 - High fever (above 103°F/39.4°C) with other serious symptoms
 """
 
-            # Add patient intake data to context
-            if intake_data:
-                system_context += f"""
-
-PATIENT INFORMATION:
-- Age Range: {intake_data.get('ageRange', 'Not specified')}
-- Sex: {intake_data.get('sex', 'Not specified')}
-- Main Symptom: {intake_data.get('symptom', 'Not specified')}
-- Duration: {intake_data.get('duration', 'Not specified')}
-- Severity (1-5): {intake_data.get('severity', 'Not specified')}
-- Additional Context: {intake_data.get('context', 'None provided')}
-"""
-
-            # Build conversation history for context
-            if conversation_history:
-                system_context += "\n\nRECENT CONVERSATION:\n"
-                # Keep last 6 messages (3 exchanges) for context
-                recent_history = conversation_history[-6:]
-                for msg in recent_history:
-                    role = msg.get('role', '')
-                    content = msg.get('content', '')
-                    
-                    if role == 'user':
-                        system_context += f"Patient: {content}\n"
-                    elif role == 'assistant':
-                        # Strip HTML tags for context
-                        import re
-                        clean_content = re.sub(r'<[^>]+>', '', content)
-                        # Limit length to avoid token issues
-                        clean_content = clean_content[:500] + '...' if len(clean_content) > 500 else clean_content
-                        system_context += f"You: {clean_content}\n"
-
-            # Create the full prompt
-            full_prompt = f"""{system_context}
-
-CURRENT PATIENT MESSAGE:
-{user_message}
-
-Please provide a helpful, medically-informed response. Use HTML formatting (paragraphs, bold text, lists) to make your response clear and easy to read. Structure your response with appropriate sections if needed."""
-
-            # Generate response from Gemini
-            response = model.generate_content(full_prompt)
-
-            # Check if response was successful
-            if response and response.text:
-                return JsonResponse({
-                    'response': response.text,
-                    'status': 'success'
-                })
-            else:
-                return JsonResponse({
-                    'error': 'No response generated from AI',
-                    'status': 'error'
-                }, status=500)
-
-        except Exception as e:
-            print(f"Error in chat_api: {str(e)}")  # Log error for debugging
-            return JsonResponse({
-                'error': 'An error occurred while processing your request',
-                'details': str(e),
-                'status': 'error'
-            }, status=500)
-
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
-
-def initial_consultation_api(request):
-    """API endpoint for generating the initial consultation response"""
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            intake_data = data.get('intake_data', {})
-
-            if not intake_data:
-                return JsonResponse({'error': 'No intake data provided'}, status=400)
-
-            # Create the model (using Gemini 1.5 Flash - better free tier limits)
-            model = genai.GenerativeModel('gemini-2.5-flash')
-
-            # Build the prompt for initial consultation
-            prompt = f"""You are MedAI, a compassionate medical AI assistant. A patient has just shared their symptoms with you. Provide a thorough initial assessment.
-
-PATIENT INFORMATION:
-- Age Range: {intake_data.get('ageRange', 'Not specified')}
-- Sex: {intake_data.get('sex', 'Not specified')}
-- Main Symptom: {intake_data.get('symptom', 'Not specified')}
-- Duration: {intake_data.get('duration', 'Not specified')}
-- Severity (1-5): {intake_data.get('severity', 'Not specified')}
-- Additional Context: {intake_data.get('context', 'None provided')}
-
-INSTRUCTIONS:
-1. Start with a warm, empathetic greeting
-2. Provide an initial assessment with possible causes (use collapsible HTML sections)
-3. Offer evidence-based self-care advice
-4. If severity is 4-5, include urgent care warning
-5. Explain when to see a doctor
-6. End by asking if they have questions
-
-FORMAT YOUR RESPONSE WITH HTML:
+FORMAT_SPEC = """HTML FORMAT REFERENCE:
 - Use <p> for paragraphs
 - Use <strong> for emphasis
 - Use <ul> and <li> for lists
-- Create collapsible sections like this:
+- When asked for collapsible sections, create them like this:
 
 <div class="collapsible-section active">
     <div class="collapsible-header" onclick="toggleCollapsible(this)">
@@ -173,31 +70,586 @@ FORMAT YOUR RESPONSE WITH HTML:
         </div>
     </div>
 </div>
+"""
+
+# Fast emergency screen run alongside the initial consultation; its only
+# effect is to put an urgent-care warning ahead of the consultation.
+TRIAGE_SYSTEM_PROMPT = """You are a medical triage checker. Read the patient information and reply with exactly one word:
+URGENT if it suggests an emergency that needs immediate medical attention (for example difficulty breathing, chest pain or pressure, severe bleeding, loss of consciousness or confusion, stroke signs, severe allergic reaction, severe abdominal pain, very high fever, or severity 5),
+otherwise ROUTINE."""
+
+URGENT_CARE_NOTICE = """<p><strong>⚠️ Your symptoms may need urgent medical attention.</strong> If you have difficulty breathing, chest pain, severe bleeding, confusion or any other emergency sign, call your local emergency number or go to the nearest emergency department now.</p>
+"""
+
+# Prompt templates are plain module constants, filled in with str.format per
+# request, instead of f-strings rebuilt inside the views.
+_INTAKE_TEMPLATE = """PATIENT INFORMATION:
+- Age Range: {intake.age_range}
+- Sex: {intake.sex}
+- Main Symptom: {intake.symptom}
+- Duration: {intake.duration}
+- Severity (1-5): {intake.severity}
+- Additional Context: {intake.context}
+"""
+
+_INITIAL_PROMPT_TEMPLATE = """A patient has just shared their symptoms with you. Provide a thorough initial assessment.
+
+{intake_block}
+INSTRUCTIONS:
+1. Start with a warm, empathetic greeting
+2. Provide an initial assessment with possible causes (use collapsible HTML sections)
+3. Offer evidence-based self-care advice
+4. If severity is 4-5, include urgent care warning
+5. Explain when to see a doctor
+6. End by asking if they have questions
+
+FORMAT YOUR RESPONSE WITH HTML, using the collapsible sections from the format reference.
 
 Create sections for: Possible Causes, Self-Care Advice, When to See a Doctor, and (if severe) When to Seek Immediate Care.
 
 Provide a comprehensive, caring, and medically-informed initial assessment."""
 
-            # Generate response
-            response = model.generate_content(prompt)
+# Static framing around the patient's message in chat_api prompts
+CURRENT_MESSAGE_HEADER = "\n\nCURRENT PATIENT MESSAGE:\n"
+CHAT_RESPONSE_INSTRUCTIONS = "\n\nPlease provide a helpful, medically-informed response. Use HTML formatting (paragraphs, bold text, lists) to make your response clear and easy to read. Structure your response with appropriate sections if needed."
+RECENT_CONVERSATION_HEADER = "\n\nRECENT CONVERSATION:\n"
+
+# Matches HTML tags in assistant replies replayed as conversation context
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# One candidate and a capped output length keep Gemini from over-generating.
+# Thinking is off, so the cap applies to the visible reply alone. It is 2048
+# rather than 1024 because a consultation asks for four collapsible sections,
+# and their wrapper markup alone comes to several hundred tokens.
+GENERATION_CFG = types.GenerateContentConfig(
+    system_instruction=MEDAI_SYSTEM_PROMPT + "\n" + FORMAT_SPEC,
+    candidate_count=1,
+    max_output_tokens=2048,
+    temperature=0.4,
+    thinking_config=types.ThinkingConfig(thinking_budget=0),
+)
+
+TRIAGE_CFG = types.GenerateContentConfig(
+    system_instruction=TRIAGE_SYSTEM_PROMPT,
+    candidate_count=1,
+    max_output_tokens=8,
+    temperature=0.0,
+)
+
+
+class _LoopResources:
+    """Gemini client and request limit owned by one event loop"""
+
+    def __init__(self, loop):
+        # The async httpx transport keeps a pool of HTTP/2 connections alive
+        # so requests don't pay a TCP+TLS handshake each. Passing a transport
+        # also keeps google-genai on httpx rather than aiohttp.
+        self.client = genai.Client(
+            api_key=settings.GEMINI_API_KEY,
+            http_options=types.HttpOptions(
+                async_client_args={
+                    'transport': httpx.AsyncHTTPTransport(
+                        http2=True,
+                        limits=httpx.Limits(
+                            max_connections=64,
+                            max_keepalive_connections=32,
+                            keepalive_expiry=60,
+                        ),
+                    ),
+                },
+            ),
+        )
+        # Bounds how many Gemini requests this loop has waiting on a response
+        self.semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+        # asyncio.run(), which uvicorn and async_to_sync both use, cancels the
+        # tasks left on a loop before closing it; this one closes the pool then.
+        self._closer = loop.create_task(self._close_on_shutdown(loop))
+
+    async def _close_on_shutdown(self, loop):
+        """Wait until the loop shuts down, then release the pooled connections"""
+        try:
+            await loop.create_future()
+        finally:
+            with _resources_by_loop_lock:
+                _resources_by_loop.pop(loop, None)
+            # aclose() only closes the async side; each Client also opens a sync httpx client
+            self.client.close()
+            await self.client.aio.aclose()
+
+
+# Pooled connections and asyncio primitives only work on the loop that
+# created them. Under ASGI each worker runs one long-lived loop, so its
+# resources are shared by every request. Under WSGI (runserver, wsgi.py),
+# async_to_sync runs each request on a new loop that is closed afterwards,
+# so each loop gets its own resources, released when the loop shuts down.
+_resources_by_loop = {}
+_resources_by_loop_lock = threading.Lock()
+
+
+def _loop_resources():
+    """Return the Gemini resources for the running event loop, creating them on first use"""
+    loop = asyncio.get_running_loop()
+    with _resources_by_loop_lock:
+        resources = _resources_by_loop.get(loop)
+        if resources is None:
+            resources = _resources_by_loop[loop] = _LoopResources(loop)
+    return resources
+
+
+def _gemini_client():
+    """Return the Gemini client for the running event loop"""
+    return _loop_resources().client
+
+
+def _gemini_semaphore():
+    """Return the Gemini concurrency limit for the running event loop"""
+    return _loop_resources().semaphore
+
+
+async def _open_stream(contents, config):
+    """Start a generate_content stream and wait for its first chunk"""
+    stream = await _gemini_client().aio.models.generate_content_stream(
+        model=GEMINI_MODEL_NAME,
+        contents=contents,
+        config=config,
+    )
+    # The request is only sent once the stream is iterated, so pull the first
+    # chunk here to surface API errors to the caller while it holds the semaphore.
+    first = await anext(stream, None)
+
+    async def chunks():
+        if first is not None:
+            yield first
+        async for chunk in stream:
+            yield chunk
+
+    return chunks()
+
+
+async def _send_message_stream(message, history):
+    """Start a streamed chat reply on top of the stored history"""
+    contents = [
+        types.Content(role=turn['role'], parts=[types.Part.from_text(text=part) for part in turn['parts']])
+        for turn in history
+    ]
+    contents.append(types.Content(role='user', parts=[types.Part.from_text(text=message)]))
+    async with _gemini_semaphore():
+        return await _open_stream(contents, GENERATION_CFG)
+
+
+async def _is_urgent(intake_text):
+    """Ask the triage model whether the intake details suggest an emergency"""
+    async with _gemini_semaphore():
+        response = await _gemini_client().aio.models.generate_content(
+            model=TRIAGE_MODEL_NAME,
+            contents=intake_text,
+            config=TRIAGE_CFG,
+        )
+    return (response.text or '').strip().upper().startswith('URGENT')
+
+
+# Chat history is kept server-side per conversation, in Django's cache, so a
+# follow-up only sends the new patient message instead of replaying the chat.
+HISTORY_TTL = 60 * 60 * 24  # seconds
+# Messages kept after the opening exchange, which carries the intake details
+HISTORY_MAX_MESSAGES = 6
+# Longest assistant reply, in characters, replayed as context
+MAX_HIST_CHARS = 500
+
+
+# Conversation ids are uuid4 hex strings handed to the page, one per consultation
+_CONVERSATION_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+def _history_key(conversation_id):
+    """Cache key for a conversation's stored chat history"""
+    return f"medai:history:{conversation_id}"
+
+
+def _clean_for_history(content):
+    """Reduce an assistant reply to short plain text for use as context"""
+    # Strip HTML tags for context
+    clean_content = _TAG_RE.sub('', content)
+    # Limit length to avoid token issues
+    if len(clean_content) > MAX_HIST_CHARS:
+        clean_content = clean_content[:MAX_HIST_CHARS] + '…'
+    return clean_content
+
+
+def _reply_digest(reply):
+    """Hash a full assistant reply, as sent to the page, for use in cache keys"""
+    return hashlib.sha256(reply.encode()).hexdigest()
+
+
+async def _load_history(conversation_id):
+    """Return the stored chat history for a conversation, oldest first"""
+    return await cache.aget(_history_key(conversation_id), [])
+
+
+async def _save_exchange(conversation_id, history, message, reply):
+    """Append a message and its reply to the stored chat history"""
+    exchange = (
+        {'role': 'user', 'parts': [message]},
+        # The stored part is shortened, so keep a digest of the full reply
+        # to key follow-up caches on
+        {'role': 'model', 'parts': [_clean_for_history(reply)], 'reply_digest': _reply_digest(reply)},
+    )
+    if len(history) < 2:
+        # The opening exchange carries the intake details and stays pinned
+        history = history + list(exchange)
+    else:
+        # A bounded deque drops the oldest turns as new ones are appended
+        recent = collections.deque(history[2:], maxlen=HISTORY_MAX_MESSAGES)
+        recent.extend(exchange)
+        history = history[:2] + list(recent)
+    await cache.aset(_history_key(conversation_id), history, HISTORY_TTL)
+
+
+# Generated responses are cached in two levels. Identical intake forms and
+# follow-ups are common, so repeats are answered without calling Gemini:
+# first from a per-process TTLCache, then from the shared Django cache
+# (Redis when REDIS_URL is set), which every worker can hit.
+RESPONSE_CACHE_TTL = 600  # seconds, in-process
+SHARED_RESPONSE_CACHE_TTL = 3600  # seconds, shared cache
+_response_cache = cachetools.TTLCache(maxsize=1024, ttl=RESPONSE_CACHE_TTL)
+_response_cache_lock = threading.Lock()
+
+# Free-text intake fields that are case/whitespace-normalized for cache keys
+_FREE_TEXT_INTAKE_FIELDS = ('symptom', 'context')
+
+
+def _normalize_intake(intake):
+    """Normalize free-text intake fields so trivially different forms share a key"""
+    fields = msgspec.structs.asdict(intake)
+    for field in _FREE_TEXT_INTAKE_FIELDS:
+        fields[field] = fields[field].strip().lower()
+    return fields
+
+
+def _cache_key(kind, *parts):
+    """Hash the request fields that determine a response into a cache key"""
+    digest = hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return f"medai:{kind}:{digest}"
+
+
+async def _cache_get(key):
+    """Return the cached response text for key, or None"""
+    with _response_cache_lock:
+        text = _response_cache.get(key)
+    if text is None:
+        text = await cache.aget(key)
+        if text is not None:
+            with _response_cache_lock:
+                _response_cache[key] = text
+    return text
+
+
+async def _cache_set(key, text):
+    """Store generated response text under key in both cache levels"""
+    with _response_cache_lock:
+        _response_cache[key] = text
+    await cache.aset(key, text, SHARED_RESPONSE_CACHE_TTL)
+
+
+# Near-duplicate follow-ups ("I have a headache" / "my head hurts") asked in
+# the same context reuse a reply. Toggle with SEMANTIC_CACHE_ENABLED.
+_semantic_cache = SemanticCache(maxsize=1024, threshold=settings.SEMANTIC_CACHE_THRESHOLD)
+
+
+async def _embed_message(text):
+    """Return a unit-length embedding of text, or None if embedding fails"""
+    # The lookup has to finish before we know whether to call Gemini at all,
+    # so it runs first, under the same limit as every other Gemini request.
+    try:
+        async with _gemini_semaphore():
+            result = await _gemini_client().aio.models.embed_content(
+                model=EMBEDDING_MODEL_NAME,
+                contents=text,
+                config=types.EmbedContentConfig(task_type='SEMANTIC_SIMILARITY'),
+            )
+    except (genai_errors.APIError, httpx.HTTPError) as e:
+        logger.warning("Embedding failed, skipping semantic cache: %s", e)
+        return None
+    if not result.embeddings or not result.embeddings[0].values:
+        logger.warning("Embedding response was empty, skipping semantic cache")
+        return None
+    return normalize_embedding(result.embeddings[0].values)
+
+
+def _intake_block(intake):
+    """Format the patient's intake answers for a prompt"""
+    return _INTAKE_TEMPLATE.format(intake=intake)
+
+
+def _build_prompt_message_only(user_message):
+    """Build a chat prompt for a bare message with no intake or prior turns"""
+    return CURRENT_MESSAGE_HEADER + user_message + CHAT_RESPONSE_INSTRUCTIONS
+
+
+def _build_prompt_full(user_message, intake_block, conversation_history):
+    """Build a chat prompt that replays the intake and the client's recent turns"""
+    # Collect the pieces in a list and join once instead of growing a str
+    parts = [intake_block]
+    if conversation_history:
+        parts.append(RECENT_CONVERSATION_HEADER)
+        # ChatRequest already caps this at the last MAX_HISTORY_MESSAGES messages
+        for msg in conversation_history:
+            if msg.role == 'user':
+                parts.append(f"Patient: {msg.content}\n")
+            elif msg.role == 'assistant':
+                parts.append(f"You: {_clean_for_history(msg.content)}\n")
+    parts.append(CURRENT_MESSAGE_HEADER)
+    parts.append(user_message)
+    parts.append(CHAT_RESPONSE_INSTRUCTIONS)
+    return "".join(parts)
+
+
+def _json_response(payload, status=200):
+    """Return payload serialized with orjson as an application/json response"""
+    return HttpResponse(orjson.dumps(payload), content_type='application/json', status=status)
+
+
+def _sse_event(payload):
+    """Format a payload as a server-sent event"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def _cached_events(text):
+    """Replay a cached response as a single text event"""
+    yield _sse_event({'text': text})
+    yield _sse_event({'status': 'success'})
+
+
+async def _gemini_events(message, history, view_name, on_complete, triage_text=None):
+    """Relay Gemini output as it is generated, then pass the full text to on_complete.
+
+    on_complete also gets whether the reply may be cached, which is only True
+    when Gemini finished normally (STOP) and any triage check succeeded. When
+    triage_text is given it is screened by the triage model concurrently with
+    the main request, and an urgent result is sent ahead of the reply.
+    """
+    notice = ''
+    chunks = []
+    finish_reason = None
+    triage_failed = False
+    try:
+        if triage_text is None:
+            stream = await _send_message_stream(message, history)
+        else:
+            stream, urgent = await asyncio.gather(
+                _send_message_stream(message, history),
+                _is_urgent(triage_text),
+                return_exceptions=True,
+            )
+            if isinstance(stream, BaseException):
+                raise stream
+            if isinstance(urgent, BaseException):
+                # The consultation already urges care for severe symptoms, but
+                # without a verdict the reply may be missing the urgent notice
+                logger.warning("Triage check failed: %s", urgent)
+                triage_failed = True
+            elif urgent:
+                notice = URGENT_CARE_NOTICE
+                yield _sse_event({'text': notice})
+
+        async for chunk in stream:
+            if chunk.candidates and chunk.candidates[0].finish_reason:
+                finish_reason = chunk.candidates[0].finish_reason
+            text = chunk.text
+            if text:
+                chunks.append(text)
+                yield _sse_event({'text': text})
+    except Exception as e:
+        logger.exception("%s failed", view_name)
+        yield _sse_event({
+            'error': 'An error occurred while processing your request',
+            'details': str(e),
+            'status': 'error'
+        })
+        return
+
+    if chunks:
+        # A reply cut off at the cap, by a safety filter or for any other reason
+        # must not be served to other patients
+        complete = finish_reason == types.FinishReason.STOP
+        if not complete:
+            logger.warning("%s reply ended with %s, not caching it", view_name, finish_reason)
+        # Cache hits never re-run triage, so only cache replies that were screened
+        await on_complete(notice + ''.join(chunks), complete and not triage_failed)
+        yield _sse_event({'status': 'success'})
+    else:
+        yield _sse_event({
+            'error': 'No response generated from AI',
+            'status': 'error'
+        })
+
+
+async def _with_conversation_id(conversation_id, events):
+    """Announce the conversation id to the page ahead of the reply events"""
+    yield _sse_event({'conversation_id': conversation_id})
+    async for event in events:
+        yield event
+
+
+def _event_stream_response(events, cache_status, conversation_id):
+    """Wrap an event generator in a streaming response tagged with X-Cache"""
+    response = StreamingHttpResponse(
+        _with_conversation_id(conversation_id, events), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep proxies from buffering the stream
+    response['X-Cache'] = cache_status
+    return response
+
+# Create your views here.
+
+@ensure_csrf_cookie
+def landing_view(request):
+    """Landing page with intake form"""
+    return render(request, 'landing.html')
 
-            if response and response.text:
-                return JsonResponse({
-                    'response': response.text,
-                    'status': 'success'
-                })
+@ensure_csrf_cookie
+def chat_view(request):
+    """Chat interface page"""
+    return render(request, 'chat.html')
+
+@require_POST
+@csrf_protect
+async def chat_api(request):
+    """API endpoint for chat messages"""
+    try:
+        body = msgspec.json.decode(request.body, type=ChatRequest)
+        user_message = body.message
+        conversation_history = body.history
+        intake = body.intake_data
+
+        if not user_message:
+            return _json_response({'error': 'No message provided'}, status=400)
+
+        # Each chat tab sends back the id its consultation was given, so tabs
+        # sharing a session don't answer against each other's history
+        conversation_id = body.conversation_id
+        if _CONVERSATION_ID_RE.fullmatch(conversation_id):
+            history = await _load_history(conversation_id)
+        else:
+            conversation_id = uuid.uuid4().hex
+            history = []
+
+        if history:
+            # Prior turns are already stored server-side; send only the new message
+            last_reply_digest = history[-1]['reply_digest']
+            message = user_message
+        else:
+            # No stored history (e.g. it expired), so rebuild context from the client's copy.
+            # Decide once which prompt shape applies; the medical guidelines are the system instruction.
+            has_intake = not intake.is_empty()
+            has_history = bool(conversation_history)
+            if has_history:
+                # The page keeps each reply exactly as streamed, so this matches the stored digest
+                last_reply_digest = next(
+                    (_reply_digest(msg.content) for msg in reversed(conversation_history)
+                     if msg.role == 'assistant'),
+                    ''
+                )
             else:
-                return JsonResponse({
-                    'error': 'No response generated',
-                    'status': 'error'
-                }, status=500)
-
-        except Exception as e:
-            print(f"Error in initial_consultation_api: {str(e)}")
-            return JsonResponse({
-                'error': 'An error occurred',
-                'details': str(e),
-                'status': 'error'
-            }, status=500)
-
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
\ No newline at end of file
+                last_reply_digest = ''
+            if has_intake or has_history:
+                message = _build_prompt_full(
+                    user_message,
+                    _intake_block(intake) if has_intake else '',
+                    conversation_history,
+                )
+            else:
+                message = _build_prompt_message_only(user_message)
+
+        # Identical follow-ups to the same answer short-circuit to the cache
+        normalized_intake = _normalize_intake(intake)
+        cache_key = _cache_key('chat', user_message, last_reply_digest, normalized_intake)
+        cached_text = await _cache_get(cache_key)
+        if cached_text is not None:
+            await _save_exchange(conversation_id, history, message, cached_text)
+            return _event_stream_response(_cached_events(cached_text), 'HIT', conversation_id)
+
+        # Then look for a differently worded message with the same meaning
+        semantic_namespace = _cache_key('semantic', last_reply_digest, normalized_intake)
+        embedding = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            embedding = await _embed_message(user_message)
+            if embedding is not None:
+                similar_text = _semantic_cache.get(semantic_namespace, embedding)
+                if similar_text is not None:
+                    await _save_exchange(conversation_id, history, message, similar_text)
+                    return _event_stream_response(
+                        _cached_events(similar_text), 'SEMANTIC-HIT', conversation_id
+                    )
+
+        async def on_complete(text, cacheable):
+            if cacheable:
+                await _cache_set(cache_key, text)
+                if embedding is not None:
+                    _semantic_cache.set(semantic_namespace, user_message, embedding, text)
+            await _save_exchange(conversation_id, history, message, text)
+
+        # Stream the response from Gemini as it is generated
+        return _event_stream_response(
+            _gemini_events(message, history, 'chat_api', on_complete), 'MISS', conversation_id
+        )
+
+    except msgspec.DecodeError as e:
+        return _json_response({'error': f'Invalid request: {e}'}, status=400)
+    except Exception as e:
+        logger.exception("chat_api failed")
+        return _json_response({
+            'error': 'An error occurred while processing your request',
+            'details': str(e),
+            'status': 'error'
+        }, status=500)
+
+@require_POST
+@csrf_protect
+async def initial_consultation_api(request):
+    """API endpoint for generating the initial consultation response"""
+    try:
+        body = msgspec.json.decode(request.body, type=ConsultationRequest)
+        intake = body.intake_data
+
+        if intake.is_empty():
+            return _json_response({'error': 'No intake data provided'}, status=400)
+
+        # Build the prompt for initial consultation
+        intake_block = _intake_block(intake)
+        prompt = _INITIAL_PROMPT_TEMPLATE.format(intake_block=intake_block)
+
+        # Each consultation starts a new server-side conversation; its id is
+        # sent to the page as the first event and posted back with each message
+        conversation_id = uuid.uuid4().hex
+
+        cache_key = _cache_key('consultation', _normalize_intake(intake))
+        cached_text = await _cache_get(cache_key)
+        if cached_text is not None:
+            await _save_exchange(conversation_id, [], prompt, cached_text)
+            return _event_stream_response(_cached_events(cached_text), 'HIT', conversation_id)
+
+        async def on_complete(text, cacheable):
+            if cacheable:
+                await _cache_set(cache_key, text)
+            await _save_exchange(conversation_id, [], prompt, text)
+
+        # Stream the response
+        return _event_stream_response(
+            _gemini_events(
+                prompt, [], 'initial_consultation_api', on_complete, triage_text=intake_block
+            ),
+            'MISS',
+            conversation_id
+        )
+
+    except msgspec.DecodeError as e:
+        return _json_response({'error': f'Invalid request: {e}'}, status=400)
+    except Exception as e:
+        logger.exception("initial_consultation_api failed")
+        return _json_response({
+            'error': 'An error occurred',
+            'details': str(e),
+            'status': 'error'
+        }, status=500)